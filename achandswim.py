@@ -1,16 +1,37 @@
 import time
 import re
+import string
 import yaml
 from dataclasses import dataclass
 from enum import StrEnum, auto
 from pathlib import Path
-from typing import Any, Optional, List, Dict, Tuple
+from itertools import islice
+from typing import Any, Optional, List, Dict, Tuple, Iterable, TextIO, Callable
 from ftfcu_appworx import Apwx, JobTime
 from oracledb import Connection as DbConnection
 from datetime import datetime
+from decimal import Decimal
+
+try:
+    from yaml import CSafeLoader as YamlLoader  # libyaml C parser
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 _version_ = "1.051"
 
+WRITE_BUFFER_SIZE = 1024 * 1024  # 1 MiB output buffer for ACH/SWIM files
+HOLD_BATCH_SIZE = 500  # Hold rows sent per executemany round trip
+
+# Addenda record: Record Type 7, Addenda Type 05, payment info, sequence number
+_ADDENDA_RE = re.compile(r'^705(.+)\d{3}$')
+
+# Valid federal district prefixes (positions 3-4 of a routing number)
+_FED_DISTRICTS = frozenset({
+    '01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12',
+    '20', '21', '22', '23', '24', '25', '26', '27', '28', '29',
+    '30', '31', '32', '33', '34', '35', '36', '37', '38', '39'
+})
+
 
 class AppWorxEnum(StrEnum):
     # HOST = auto()
@@ -42,7 +63,7 @@ class ScriptData:
     apwx: Apwx
     dbh: DbConnection
     config: Any
-    newach_data: List[List[str]]
+    newach_data: List[Dict[str, Any]]
     all_onus_data: List[List[Any]]
     bad_desc: List[str]
     entry_hash_cnt: int
@@ -55,6 +76,7 @@ class ScriptData:
     swm_lines: List[str]
     gl_cr_line: str
     sth: Dict[str, Any]
+    onus_prefixes: Tuple[str, str]
 
 
 def run(apwx: Apwx, current_time: float) -> bool:
@@ -96,6 +118,7 @@ def initialize(apwx: Apwx) -> ScriptData:
     """Initialize script data and database connection"""
     dbh = apwx.db_connect(autocommit=False)
     config = get_config(apwx)
+    ftfcu_routenbr = apwx.args.FTFCU_ROUTENBR
 
     script_data = ScriptData(
         apwx=apwx,
@@ -113,7 +136,9 @@ def initialize(apwx: Apwx) -> ScriptData:
         swim_file_info={},
         swm_lines=[],
         gl_cr_line="",
-        sth={}
+        sth={},
+        # On-us entry detail prefix: Record Type 6, TC 22/32 (credits), our routing number
+        onus_prefixes=(f'622{ftfcu_routenbr}', f'632{ftfcu_routenbr}')
     )
 
     prepare_statements(script_data)
@@ -122,159 +147,166 @@ def initialize(apwx: Apwx) -> ScriptData:
 
 def parse_ach_file(script_data: ScriptData) -> bool:
     """Parse ACH file and extract on-us data"""
-    current_batch = []
+    current_batch = None
     onus_data = []
+    onus_entry = None
     is_onus = 0
-    ftfcu_routenbr = script_data.apwx.args.FTFCU_ROUTENBR
+    onus_prefixes = script_data.onus_prefixes
+
+    # Bind attribute lookups used on every record to locals
+    newach_append = script_data.newach_data.append
+    onus_append = script_data.all_onus_data.append
+    addenda_match = _ADDENDA_RE.match
 
     try:
+        # Read the whole file at once and split in C rather than iterating line by line
         with open(script_data.apwx.args.INPUT_ACH_FILE_FULLPATH, 'r') as achfile:
-            for line in achfile:
-                line = line.strip()
-                if not line:
-                    continue
-
-                if line.startswith('101'):  # File Header Record
-                    """
-                    ACH File Header Record (Record Type Code 1):
-                    Position 1: Record Type Code (1)
-                    Position 2-3: Priority Code (01)
-                    Position 4-13: Immediate Destination (061000146)
-                    Position 14-23: Immediate Origin (3211803792)
-                    Position 24-29: File Creation Date (250811)
-                    Position 30-33: File Creation Time (0832)
-                    Position 34: File ID Modifier (A)
-                    Position 35-37: Record Size (094)
-                    Position 38-39: Blocking Factor (10)
-                    Position 40: Format Code (1)
-                    Position 41-63: Immediate Destination Name (FRB Atlanta)
-                    Position 64-86: Immediate Origin Name (First Tech Federal Cred)
-                    Position 87-94: Reference Code
-                    """
-                    script_data.file_header = line
-                    continue
-
-                elif line.startswith('9'):  # File Control Record
-                    """
-                    ACH File Control Record (Record Type Code 9):
-                    Position 1: Record Type Code (9)
-                    Position 2-7: Batch Count
-                    Position 8-13: Block Count
-                    Position 14-21: Entry/Addenda Count
-                    Position 22-31: Entry Hash
-                    Position 32-43: Total Debit Entry Dollar Amount
-                    Position 44-55: Total Credit Entry Dollar Amount
-                    Position 56-94: Reserved
-                    """
-                    break  # end of file
-
-                elif line.startswith('8'):  # Batch Control Record
-                    """
-                    ACH Batch Control Record (Record Type Code 8):
-                    Position 1: Record Type Code (8)
-                    Position 2-4: Service Class Code
-                    Position 5-10: Entry/Addenda Count
-                    Position 11-20: Entry Hash
-                    Position 21-32: Total Debit Entry Dollar Amount
-                    Position 33-44: Total Credit Entry Dollar Amount
-                    Position 45-54: Company Identification
-                    Position 55-73: Message Authentication Code
-                    Position 74-79: Reserved
-                    Position 80-87: Originating DFI Identification
-                    Position 88-94: Batch Number
-                    """
-                    if current_batch:
-                        if is_onus and onus_data:
-                            last_line = onus_data.pop()
-                            current_batch.append(last_line)
-                            onus_data = []
-                            is_onus = 0
-                        script_data.newach_data.append(current_batch[:])
-                        current_batch = []
-                    continue
-
-                elif line.startswith('5'):  # Batch Header Record
-                    """
-                    ACH Batch Header Record (Record Type Code 5):
-                    Position 1: Record Type Code (5)
-                    Position 2-4: Service Class Code (200=Mixed, 220=Credits Only, 225=Debits Only)
-                    Position 5-20: Company Name
-                    Position 21-40: Company Discretionary Data
-                    Position 41-50: Company Identification
-                    Position 51-53: Standard Entry Class Code
-                    Position 54-63: Company Entry Description
-                    Position 64-69: Company Descriptive Date
-                    Position 70-75: Effective Entry Date
-                    Position 76-78: Settlement Date
-                    Position 79: Originator Status Code
-                    Position 80-87: Originating DFI Identification
-                    Position 88-94: Batch Number
-                    """
-                    current_batch = [line]
-                    continue
-
-                elif line.startswith('7'):  # Addenda Record
-                    """
-                    ACH Addenda Record (Record Type Code 7):
-                    Position 1: Record Type Code (7)
-                    Position 2-3: Addenda Type Code (05=Standard)
-                    Position 4-83: Payment Related Information
-                    Position 84-87: Addenda Sequence Number
-                    Position 88-94: Entry Detail Sequence Number
-                    """
-                    if not is_onus:
-                        current_batch.append(line)
-                    elif 'EXT OAO' not in line:
-                        last_line = onus_data.pop()
-                        current_batch.append(last_line)
-                        current_batch.append(line)
+            ach_lines = achfile.read().split('\n')
+
+        for line in ach_lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith('101'):  # File Header Record
+                """
+                ACH File Header Record (Record Type Code 1):
+                Position 1: Record Type Code (1)
+                Position 2-3: Priority Code (01)
+                Position 4-13: Immediate Destination (061000146)
+                Position 14-23: Immediate Origin (3211803792)
+                Position 24-29: File Creation Date (250811)
+                Position 30-33: File Creation Time (0832)
+                Position 34: File ID Modifier (A)
+                Position 35-37: Record Size (094)
+                Position 38-39: Blocking Factor (10)
+                Position 40: Format Code (1)
+                Position 41-63: Immediate Destination Name (FRB Atlanta)
+                Position 64-86: Immediate Origin Name (First Tech Federal Cred)
+                Position 87-94: Reference Code
+                """
+                script_data.file_header = line
+                continue
+
+            elif line.startswith('9'):  # File Control Record
+                """
+                ACH File Control Record (Record Type Code 9):
+                Position 1: Record Type Code (9)
+                Position 2-7: Batch Count
+                Position 8-13: Block Count
+                Position 14-21: Entry/Addenda Count
+                Position 22-31: Entry Hash
+                Position 32-43: Total Debit Entry Dollar Amount
+                Position 44-55: Total Credit Entry Dollar Amount
+                Position 56-94: Reserved
+                """
+                break  # end of file
+
+            elif line.startswith('8'):  # Batch Control Record
+                """
+                ACH Batch Control Record (Record Type Code 8):
+                Position 1: Record Type Code (8)
+                Position 2-4: Service Class Code
+                Position 5-10: Entry/Addenda Count
+                Position 11-20: Entry Hash
+                Position 21-32: Total Debit Entry Dollar Amount
+                Position 33-44: Total Credit Entry Dollar Amount
+                Position 45-54: Company Identification
+                Position 55-73: Message Authentication Code
+                Position 74-79: Reserved
+                Position 80-87: Originating DFI Identification
+                Position 88-94: Batch Number
+                """
+                if current_batch:
+                    if is_onus and onus_data:
+                        add_batch_entry(current_batch, *onus_entry)
                         onus_data = []
                         is_onus = 0
-                    else:
-                        # Extract description from addenda record for OAO transfers
-                        # Position 4-83: Payment Related Information (80 characters)
-                        match = re.match(r'^705(.+)\d{3}$', line)
-                        if match:
-                            description = match.group(1).strip()  # Extract payment info
-                            description = description[:128]  # limit to 128 characters
-                            onus_data.append(description)
-                            script_data.all_onus_data.append(onus_data[:])
-                            onus_data = []
-                            is_onus = 0
-                    continue
-
-                elif line.startswith('6'):  # Entry Detail Record
-                    """
-                    ACH Entry Detail Record (Record Type Code 6):
-                    Position 1: Record Type Code (6)
-                    Position 2-3: Transaction Code (22=Checking Credit, 23=Checking Debit, 32=Savings Credit, 33=Savings Debit)
-                    Position 4-11: Receiving DFI Identification (8 digits)
-                    Position 12: Check Digit
-                    Position 13-29: DFI Account Number (17 characters, right justified, space filled)
-                    Position 30-39: Amount (10 digits, zero filled)
-                    Position 40-54: Individual Identification Number (15 characters)
-                    Position 55-76: Individual Name (22 characters)
-                    Position 77: Discretionary Data
-                    Position 78: Addenda Record Indicator (0=No Addenda, 1=Addenda Included)
-                    Position 79-94: Trace Number (15 digits: 8-digit ODFI + 7-digit sequence)
-                    """
-                    if is_onus and onus_data:
-                        last_line = onus_data.pop()
-                        current_batch.append(last_line)
+                    newach_append(current_batch)
+                    current_batch = None
+                continue
+
+            elif line.startswith('5'):  # Batch Header Record
+                """
+                ACH Batch Header Record (Record Type Code 5):
+                Position 1: Record Type Code (5)
+                Position 2-4: Service Class Code (200=Mixed, 220=Credits Only, 225=Debits Only)
+                Position 5-20: Company Name
+                Position 21-40: Company Discretionary Data
+                Position 41-50: Company Identification
+                Position 51-53: Standard Entry Class Code
+                Position 54-63: Company Entry Description
+                Position 64-69: Company Descriptive Date
+                Position 70-75: Effective Entry Date
+                Position 76-78: Settlement Date
+                Position 79: Originator Status Code
+                Position 80-87: Originating DFI Identification
+                Position 88-94: Batch Number
+                """
+                current_batch = start_batch(line)
+                continue
+
+            elif line.startswith('7'):  # Addenda Record
+                """
+                ACH Addenda Record (Record Type Code 7):
+                Position 1: Record Type Code (7)
+                Position 2-3: Addenda Type Code (05=Standard)
+                Position 4-83: Payment Related Information
+                Position 84-87: Addenda Sequence Number
+                Position 88-94: Entry Detail Sequence Number
+                """
+                if not is_onus:
+                    add_batch_record(current_batch, line)
+                elif 'EXT OAO' not in line:
+                    add_batch_entry(current_batch, *onus_entry)
+                    add_batch_record(current_batch, line)
+                    onus_data = []
+                    is_onus = 0
+                else:
+                    # Extract description from addenda record for OAO transfers
+                    # Position 4-83: Payment Related Information (80 characters)
+                    match = addenda_match(line)
+                    if match:
+                        description = match.group(1).strip()[:128]  # Payment info, limited to 128 characters
+                        onus_data.append(description)
+                        onus_append(onus_data)
                         onus_data = []
                         is_onus = 0
+                continue
+
+            elif line.startswith('6'):  # Entry Detail Record
+                """
+                ACH Entry Detail Record (Record Type Code 6):
+                Position 1: Record Type Code (6)
+                Position 2-3: Transaction Code (22=Checking Credit, 23=Checking Debit, 32=Savings Credit, 33=Savings Debit)
+                Position 4-11: Receiving DFI Identification (8 digits)
+                Position 12: Check Digit
+                Position 13-29: DFI Account Number (17 characters, right justified, space filled)
+                Position 30-39: Amount (10 digits, zero filled)
+                Position 40-54: Individual Identification Number (15 characters)
+                Position 55-76: Individual Name (22 characters)
+                Position 77: Discretionary Data
+                Position 78: Addenda Record Indicator (0=No Addenda, 1=Addenda Included)
+                Position 79-94: Trace Number (15 digits: 8-digit ODFI + 7-digit sequence)
+                """
+                if is_onus and onus_data:
+                    add_batch_entry(current_batch, *onus_entry)
+                    onus_data = []
+                    is_onus = 0
+
+                rtnbr, acctnbr, ach_tc, amt, trace_nbr, sequence_nbr, has_addenda = parse_ach_detail_record(line)
+
+                # Check if this is an on-us transaction (our routing number)
+                if line.startswith(onus_prefixes):
+                    is_onus = sequence_nbr
+                    onus_data = [rtnbr, acctnbr, ach_tc, amt, trace_nbr, line]
+                    # Held back from the batch unless it turns out not to be an OAO transfer
+                    onus_entry = (line, rtnbr, ach_tc, amt)
 
-                    # Check if this is an on-us transaction (our routing number)
-                    if re.match(f'^6[23]2{ftfcu_routenbr}', line):
-                        rtnbr, acctnbr, ach_tc, amt, trace_nbr, sequence_nbr, has_addenda = parse_ach_detail_record(
-                            line)
-                        is_onus = sequence_nbr
-                        onus_data = [rtnbr, acctnbr, ach_tc, amt, trace_nbr, line]
-
-                        continue
-                    else:
-                        current_batch.append(line)
-                        continue
+                    continue
+                else:
+                    add_batch_entry(current_batch, line, rtnbr, ach_tc, amt)
+                    continue
 
         return True
     except Exception as e:
@@ -282,6 +314,38 @@ def parse_ach_file(script_data: ScriptData) -> bool:
         return False
 
 
+def start_batch(batch_header: str) -> Dict[str, Any]:
+    """Start a new ACH batch with empty batch control totals"""
+    return {
+        'lines': [batch_header],
+        'entry_hash': 0,
+        'debit': 0,
+        'credit': 0,
+        'count': 0
+    }
+
+
+def add_batch_record(batch: Dict[str, Any], line: str) -> None:
+    """Add a record (e.g. addenda) to the batch"""
+    batch['lines'].append(line)
+    batch['count'] += 1
+
+
+def add_batch_entry(batch: Dict[str, Any], line: str, rtnbr: str, ach_tc: str, amt: int) -> None:
+    """Add an Entry Detail Record to the batch and update batch control totals"""
+    batch['lines'].append(line)
+    batch['count'] += 1
+
+    # Use first 8 digits of routing number for hash calculation
+    batch['entry_hash'] += int(rtnbr[:8])
+
+    # Check transaction code to determine if credit or debit
+    if ach_tc.endswith('2'):  # Credit transactions (22, 32, etc.)
+        batch['credit'] += amt
+    elif ach_tc.endswith('7'):  # Debit transactions (27, 37, etc.)
+        batch['debit'] += amt
+
+
 def parse_ach_detail_record(ach_detail_rec: str) -> Tuple[str, str, str, int, str, str, str]:
     """Parse ACH detail record and extract components"""
     # Position 4-12: Receiving DFI Identification (9 digits including check digit)
@@ -294,7 +358,7 @@ def parse_ach_detail_record(ach_detail_rec: str) -> Tuple[str, str, str, int, st
     ach_tc = ach_detail_rec[1:3]  # transaction code (2 digits)
 
     # Position 30-39: Amount (10 digits, zero filled, in cents)
-    amt = int(ach_detail_rec[29:39].lstrip('0') or '0')  # amount in cents
+    amt = int(ach_detail_rec[29:39])  # amount in cents
 
     # Position 79-94: Trace Number (15 digits: 8-digit ODFI + 7-digit sequence)
     trace_nbr = ach_detail_rec[79:94]  # trace number (15 digits)
@@ -311,9 +375,12 @@ def parse_ach_detail_record(ach_detail_rec: str) -> Tuple[str, str, str, int, st
 def loop_through_onus_data_create_swim_file_and_stage_holds(script_data: ScriptData) -> bool:
     """Process on-us data, create SWIM file and stage holds"""
     try:
+        report_only = is_report_only(script_data.apwx)
+        holds = []
+
         for data in script_data.all_onus_data:
-            # Convert amount from cents to dollars
-            amount = f"{(data[3] * 0.01):.2f}"
+            # Convert amount from cents to dollars; exact, unlike cents * 0.01 as a float
+            amount = Decimal(data[3]).scaleb(-2)
 
             # Always create SWIM lines for both report-only and normal mode
             script_data.swim_file_info['glDrAmt'] += data[3]  # Add to GL debit amount
@@ -322,22 +389,23 @@ def loop_through_onus_data_create_swim_file_and_stage_holds(script_data: ScriptD
             script_data.swim_file_info['swimCt'] += 1
 
             # Only insert holds if not in report-only mode
-            if not is_report_only(script_data.apwx):
-                if not insert_ach_hold(script_data, {
+            if not report_only:
+                holds.append({
                     'acctnbr': data[1],  # Account number from position 13-29
                     'amount': amount,  # Amount converted to dollars
                     'tracenbr': data[4]  # Trace number from position 79-94
-                }):
-                    print(f"Could not stage hold for account: {data[1]}")
+                })
             else:
-                print(f"Report-only mode: Would stage hold for account {data[1]} amount ${amount}")
+                print(f"Report-only mode: Would stage hold for account {data[1]} amount ${amount:.2f}")
+
+        if holds and not insert_ach_holds(script_data, holds):
+            print(f"Could not stage holds for {len(holds)} accounts")
 
         offset_gl(script_data)
         script_data.swm_lines.append(script_data.gl_cr_line)
 
         # Write SWIM file (generated in both report-only and normal mode)
-        with open(script_data.apwx.args.OUTPUT_SWIM_FILE_FULLPATH, 'w') as f:
-            f.write('\n'.join(script_data.swm_lines) + '\n')
+        write_lines(script_data.apwx.args.OUTPUT_SWIM_FILE_FULLPATH, script_data.swm_lines)
 
         return True
     except Exception as e:
@@ -345,72 +413,95 @@ def loop_through_onus_data_create_swim_file_and_stage_holds(script_data: ScriptD
         return False
 
 
-def insert_ach_hold(script_data: ScriptData, data: Dict[str, Any]) -> bool:
-    """Insert ACH hold record into database"""
+def insert_ach_holds(script_data: ScriptData, holds: List[Dict[str, Any]]) -> bool:
+    """Insert ACH hold records into database with a single prepared statement"""
     try:
         # Get SQL from config file
         sql = script_data.config.get("insert_ach_hold")
 
-        cursor = script_data.dbh.cursor()
-        cursor.execute(sql, {
-            'acctnbr': data['acctnbr'],
-            'amount': data['amount'],
+        # Binds that are the same for every hold, merged into each row's existing bind dict
+        shared_binds = {
             'reason': script_data.apwx.args.REASONTYPE,
             'reasontype': script_data.apwx.args.REASONTYPE,
             'holddate': script_data.holddate,
-            'tracenbr': data['tracenbr'],
             'acctholdcd': script_data.apwx.args.HOLD_CODE
-        })
+        }
+        for data in holds:
+            data.update(shared_binds)
+
+        cursor = script_data.dbh.cursor()
+        cursor.prepare(sql)
+
+        # Send the rows as array DML, HOLD_BATCH_SIZE rows per round trip
+        for start in range(0, len(holds), HOLD_BATCH_SIZE):
+            batch = holds[start:start + HOLD_BATCH_SIZE]
+            cursor.executemany(None, batch, batcherrors=True)
+
+            # A failed row does not stop the rest of the batch; report it like a single insert would
+            for error in cursor.getbatcherrors():
+                print(f"Could not insert hold for {batch[error.offset]['acctnbr']}: {error.message}")
         return True
     except Exception as e:
-        print(f"Could not insert hold for {data['acctnbr']}: {e}")
+        print(f"Could not insert holds: {e}")
         return False
 
 
 def create_swim_line(script_data: ScriptData, data: List[Any]) -> str:
     """Create SWIM file line from ACH data"""
-    cash_box_nbr = script_data.apwx.args.CASH_BOX_NUMBER
+    swim_file_info = script_data.swim_file_info
     amt = data[3]  # Amount in cents from ACH record position 30-39
 
     # Get transaction code mapping from SWIM file info
-    osi_tc = script_data.swim_file_info['achToDnaTc'][data[2]]['osiTC']  # data[2] = transaction code
-    desc = script_data.swim_file_info['achToDnaTc'][data[2]]['desc']
+    tc_info = swim_file_info['achToDnaTc'][data[2]]  # data[2] = transaction code
+    osi_tc = tc_info['osiTC']
+    desc = tc_info['desc']
 
-    # Format SWIM line using the format string from swim_file_info
-    line = script_data.swim_file_info['swimFmt'].format(
+    # Format the per-row fields; the fixed trailing fields are formatted once in get_swim_file_info
+    line = swim_file_info['swimHead'](
         data[1],  # Account number from position 13-29
         osi_tc,  # OSI transaction code
         amt,  # Amount in cents
         '',  # Empty field
-        script_data.swim_file_info['effDate'],  # Effective date
+        swim_file_info['effDate'],  # Effective date
         desc,  # Description
-        data[4],  # Trace number from position 79-94
-        cash_box_nbr,  # Cash box number
-        '', '',  # Empty fields
-        'EL', 'INTR', 'IMED',  # Fixed values
-        '', '', '', ''  # Empty fields
-    )
+        data[4]  # Trace number from position 79-94
+    ) + swim_file_info['swimTail']
     return line
 
 
 def write_new_ach_file(script_data: ScriptData) -> bool:
     """Write new ACH file with processed data"""
     try:
-        newfile_data = rebuild_file(script_data)
-        with open(script_data.apwx.args.OUTPUT_ACH_FILE_FULLPATH, 'w') as f:
-            f.write('\n'.join(newfile_data) + '\n')
+        with open(script_data.apwx.args.OUTPUT_ACH_FILE_FULLPATH, 'w',
+                  buffering=WRITE_BUFFER_SIZE, newline='\n') as achfile:
+            rebuild_file(script_data, achfile)
         return True
     except Exception as e:
         print(f"Error writing new ACH file: {e}")
         return False
 
 
-def rebuild_batch(script_data: ScriptData, batch_data: List[str], control_nbr: int) -> List[str]:
-    """Rebuild ACH batch with updated control numbers"""
+def write_lines(path: str, lines: List[str]) -> None:
+    """Write records to file, one per line, without joining them in memory first"""
+    with open(path, 'w', buffering=WRITE_BUFFER_SIZE, newline='\n') as f:
+        write_records(f, lines)
+
+
+def write_records(f: TextIO, lines: Iterable[str]) -> None:
+    """Write records to an open file, one per line"""
+    write = f.write
+    for line in lines:
+        write(line)
+        write('\n')
+
+
+def rebuild_batch(script_data: ScriptData, batch_data: Dict[str, Any], control_nbr: int, achfile: TextIO) -> int:
+    """Rebuild ACH batch with updated control numbers and write it, returning the number of lines written"""
     if not batch_data:
-        return []
+        return 0
 
-    batch_header = batch_data[0]
+    batch_lines = batch_data['lines']
+    batch_header = batch_lines[0]
     # Extract service class code from position 2-4 of batch header
     service_class_code = batch_header[1:4]
     # Extract company ID from position 41-50 of batch header
@@ -418,36 +509,19 @@ def rebuild_batch(script_data: ScriptData, batch_data: List[str], control_nbr: i
     # Extract ODFI from position 80-87 of batch header
     odfi = batch_header[79:87]
 
-    entry_hash_total = 0
-    debit_total = 0
-    credit_total = 0
-    total_record_cnt = 0
+    # Batch control totals were accumulated while parsing
+    entry_hash_total = batch_data['entry_hash']
+    debit_total = batch_data['debit']
+    credit_total = batch_data['credit']
+    total_record_cnt = batch_data['count']
 
     # Format new batch number as 7-digit zero-filled
     new_number = f"{control_nbr:07d}"
     # Replace last 7 characters (position 88-94) with new batch number
     batch_header = batch_header[:-7] + new_number
 
-    new_batch = [batch_header]
-
-    for line in batch_data[1:]:
-        if line.startswith('6'):  # Entry Detail Record
-            rtnbr, acctnbr, ach_tc, amt, trace_nbr, sequence_nbr, has_addenda = parse_ach_detail_record(line)
-            # Use first 8 digits of routing number for hash calculation
-            rtnbr_no_checksum = rtnbr[:8]
-            entry_hash_total += int(rtnbr_no_checksum)
-
-            # Check transaction code to determine if credit or debit
-            if ach_tc.endswith('2'):  # Credit transactions (22, 32, etc.)
-                credit_total += amt
-            elif ach_tc.endswith('7'):  # Debit transactions (27, 37, etc.)
-                debit_total += amt
-
-        total_record_cnt += 1
-        new_batch.append(line)
-
     if not total_record_cnt:
-        return []
+        return 0
 
     # Fixed-length fields for batch control record
     message_auth_cd = ' ' * 18  # Position 55-73: Message Authentication Code
@@ -463,34 +537,35 @@ def rebuild_batch(script_data: ScriptData, batch_data: List[str], control_nbr: i
     # Build batch control record (Record Type Code 8)
     batch_control_footer = f"8{service_class_code}{total_record_cnt:06d}{int(entry_hash):010d}{debit_total:012d}{credit_total:012d}{company_id}{message_auth_cd}{reserved}{odfi}{new_number}"
 
-    new_batch.append(batch_control_footer)
-    return new_batch
+    achfile.write(f"{batch_header}\n")
+    write_records(achfile, islice(batch_lines, 1, None))
+    achfile.write(f"{batch_control_footer}\n")
+    return total_record_cnt + 2  # Entries/addenda plus batch header and control
 
 
-def rebuild_file(script_data: ScriptData) -> List[str]:
-    """Rebuild complete ACH file"""
+def rebuild_file(script_data: ScriptData, achfile: TextIO) -> None:
+    """Rebuild complete ACH file, writing records as they are produced"""
     # Start with original file header (Record Type Code 1)
     file_header = script_data.file_header
     ach_data = script_data.newach_data
 
     batch_cnt = 0
-    line_cnt = 1  # Start with 1 for file control record
-    new_ach_file = [file_header]
+    line_cnt = 2  # File header plus file control record
+    achfile.write(f"{file_header}\n")
 
     # Process each batch
     for batch_data in ach_data:
         batch_cnt += 1
-        batch_file = rebuild_batch(script_data, batch_data, batch_cnt)
+        batch_line_cnt = rebuild_batch(script_data, batch_data, batch_cnt, achfile)
 
-        if not batch_file:
+        if not batch_line_cnt:
             batch_cnt -= 1
             continue
 
-        new_ach_file.extend(batch_file)
+        line_cnt += batch_line_cnt
 
     # Calculate final totals for file control record
     entry_hash = str(script_data.entry_hash_cnt)[-10:]  # Rightmost 10 digits
-    line_cnt += len(new_ach_file)
 
     # ACH files must be in blocks of 10 records
     mod = line_cnt % 10
@@ -503,34 +578,26 @@ def rebuild_file(script_data: ScriptData) -> List[str]:
     # Build file control record (Record Type Code 9)
     file_control_footer = f"9{batch_cnt:06d}{block_cnt:06d}{script_data.total_record_cnt:08d}{int(entry_hash):010d}{script_data.total_debit:012d}{script_data.total_credit:012d}{reserved}"
 
-    new_ach_file.append(file_control_footer)
+    achfile.write(f"{file_control_footer}\n")
 
     # Add padding records to make block count even
-    for _ in range(extra_lines):
-        new_ach_file.append(extra_row)
-
-    return new_ach_file
+    write_records(achfile, [extra_row] * extra_lines)
 
 
 def offset_gl(script_data: ScriptData) -> bool:
     """Create GL offset line for SWIM file"""
-    cash_box_nbr = script_data.apwx.args.CASH_BOX_NUMBER
     gl_nbr = script_data.apwx.args.GL_ACCTNBR
 
     # Create GL credit line to offset the debits
-    script_data.gl_cr_line = script_data.swim_file_info['swimFmt'].format(
+    script_data.gl_cr_line = script_data.swim_file_info['swimHead'](
         gl_nbr,  # GL account number
         'GLD',  # GL debit transaction code
         script_data.swim_file_info['glDrAmt'],  # Total debit amount
         '',  # Empty field
         script_data.swim_file_info['effDate'],  # Effective date
         'DNA ACH GL debit offset',  # Description
-        '',  # Empty trace number
-        cash_box_nbr,  # Cash box number
-        '', '',  # Empty fields
-        'EL', 'INTR', 'IMED',  # Fixed values
-        '', '', '', ''  # Empty fields
-    )
+        ''  # Empty trace number
+    ) + script_data.swim_file_info['swimTail']
     return True
 
 
@@ -548,13 +615,25 @@ def prepare_statements(script_data: ScriptData) -> bool:
 def get_swim_file_info(script_data: ScriptData) -> bool:
     """Initialize SWIM file information"""
     eff_date = script_data.apwx.args.EFFDATE
+    cash_box_nbr = script_data.apwx.args.CASH_BOX_NUMBER
+
+    # SWIM record layout, split into the fields that vary per line and the fixed trailing fields
+    swim_head_fmt = '{:0>17s}{:<4s}{:>010d}{:>06s}{:>8s}{:<45s}{:>15s}'
+    swim_tail_fmt = '{:>10s}{:>4s}{:>4s}{:<4s}{:<4s}{:<4s}{:>10s}{:<4s}{:<4s}{:1s}'
 
     script_data.swim_file_info = {
         'effDate': eff_date,
         'swimCt': 0,
         'extPmtCt': 0,
         'rptFmt': "%-25s%-30s%-15s%-15s%-25s%-100s",
-        'swimFmt': '{:0>17s}{:<4s}{:>010d}{:>06s}{:>8s}{:<45s}{:>15s}{:>10s}{:>4s}{:>4s}{:<4s}{:<4s}{:<4s}{:>10s}{:<4s}{:<4s}{:1s}',
+        'swimHeadFmt': swim_head_fmt,
+        'swimHead': compile_format(swim_head_fmt),
+        'swimTail': swim_tail_fmt.format(
+            cash_box_nbr,  # Cash box number
+            '', '',  # Empty fields
+            'EL', 'INTR', 'IMED',  # Fixed values
+            '', '', '', ''  # Empty fields
+        ),
         'glDrAmt': 0,
         'glCrAmt': 0,
         'extPmtAmt': 0,
@@ -566,6 +645,23 @@ def get_swim_file_info(script_data: ScriptData) -> bool:
     return True
 
 
+def compile_format(fmt: str) -> Callable[..., str]:
+    """Compile a positional str.format template into a function so it is parsed only once"""
+    params = []
+    body = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(fmt):
+        body.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field_name is None:
+            continue
+        if field_name or conversion:
+            raise ValueError(f"Only automatically numbered fields are supported: {fmt}")
+        param = f"a{len(params)}"
+        params.append(param)
+        body.append(f"{{{param}:{format_spec}}}")
+
+    return eval(f"lambda {', '.join(params)}: f{''.join(body)!r}")
+
+
 def validate_route_number(script_data: ScriptData, rtnbr: str) -> bool:
     """Validate routing number"""
     if not rtnbr.isdigit():
@@ -589,12 +685,13 @@ def validate_route_number(script_data: ScriptData, rtnbr: str) -> bool:
 
 def validate_routing_number_checksum(rtnbr: str) -> bool:
     """Validate routing number checksum using standard algorithm"""
-    digits = [int(d) for d in rtnbr]
-    # Standard routing number checksum calculation
+    s = rtnbr.encode()
+    # Standard routing number checksum (weights 3, 7, 1) on the ASCII codes;
+    # the weights sum to 33, so subtract 33 * ord('0') to get digit values
     checksum = (
-                       digits[0] * 3 + digits[1] * 7 + digits[2] * 1 +
-                       digits[3] * 3 + digits[4] * 7 + digits[5] * 1 +
-                       digits[6] * 3 + digits[7] * 7 + digits[8] * 1
+                       3 * (s[0] + s[3] + s[6]) +
+                       7 * (s[1] + s[4] + s[7]) +
+                       (s[2] + s[5] + s[8]) - 33 * ord('0')
                ) % 10
 
     return checksum == 0
@@ -602,14 +699,7 @@ def validate_routing_number_checksum(rtnbr: str) -> bool:
 
 def is_valid_fed_symbol(rtnbr: str) -> bool:
     """Check if routing number has valid federal district (positions 3-4)"""
-    fed_district = rtnbr[2:4]
-    fed_districts = [
-        '01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12',
-        '21', '22', '23', '24', '25', '26', '27', '28', '29', '20', '21', '22',
-        '31', '32', '33', '34', '35', '36', '37', '38', '39', '30', '31', '32'
-    ]
-
-    return fed_district in fed_districts
+    return rtnbr[2:4] in _FED_DISTRICTS
 
 
 def exit_early(script_data: ScriptData, sub: str, db_disconnect: bool = False) -> bool:
@@ -643,12 +733,6 @@ def get_hold_biz_date(script_data: ScriptData) -> bool:
 def disconnect_db(script_data: ScriptData) -> bool:
     """Disconnect from database"""
     try:
-        for handle_name, handle in script_data.sth.items():
-            if is_debug_mode(script_data.apwx):
-                print(f"Disconnecting handle {handle_name}")
-            if hasattr(handle, 'close'):
-                handle.close()
-
         script_data.dbh.close()
         return True
     except Exception as e:
@@ -669,7 +753,7 @@ def is_debug_mode(apwx: Apwx) -> bool:
 def get_config(apwx: Apwx) -> Any:
     """Load configuration from YAML file"""
     with open(apwx.args.CONFIG_FILE_PATH, "r") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=YamlLoader)
     return config
 
 